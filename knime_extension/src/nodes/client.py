@@ -0,0 +1,29 @@
+import smartsheet
+from typing import Dict, Tuple
+
+# the SDK retries rate limited (429) requests with backoff for this long (s)
+MAX_RETRY_TIME = 60
+
+# clients are kept across executions to reuse their warm connection pool
+_CLIENT_CACHE: Dict[Tuple[str, int], smartsheet.Smartsheet] = {}
+
+
+def get_smartsheet_client(
+    access_token: str, max_connections: int
+) -> smartsheet.Smartsheet:
+    """Returns the cached client for this token and connection pool size.
+
+    The pool keeps one connection per concurrent request. API errors are
+    raised as smartsheet.exceptions.ApiError instead of being returned.
+    """
+    key = (access_token, max_connections)
+    client = _CLIENT_CACHE.get(key)
+    if client is None:
+        client = smartsheet.Smartsheet(
+            access_token=access_token,
+            max_connections=max_connections,
+            max_retry_time=MAX_RETRY_TIME,
+        )
+        client.errors_as_exceptions(True)
+        client = _CLIENT_CACHE.setdefault(key, client)
+    return client
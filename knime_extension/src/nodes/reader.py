@@ -1,15 +1,24 @@
 import os
 import logging
+import math
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import knime_extension as knext
-import smartsheet
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from nodes.client import get_smartsheet_client
 
 LOGGER = logging.getLogger(__name__)
 
 TOKEN_NAME = "SMARTSHEET_ACCESS_TOKEN"
 
+# pages are fetched concurrently, bounded to stay below the API rate limit
+MAX_WORKERS = 8
+
 
 @knext.node(
     name="Smartsheet Reader",
@@ -69,7 +78,7 @@ class SmartsheetReaderNode(knext.PythonNode):
             self.access_token = _get_access_token_from_credentials_configuration(
                 exec_context
             )
-        smart = smartsheet.Smartsheet(access_token=self.access_token)
+        smart = get_smartsheet_client(self.access_token, MAX_WORKERS)
 
         page_size = 1
 
@@ -89,33 +98,32 @@ class SmartsheetReaderNode(knext.PythonNode):
             {"smartsheet_reader.source_name": sheet.name}
         )
 
-        dfs = list()
-
+        col_titles = [c.title for c in sheet.columns]
         total_row_count = sheet.total_row_count
         LOGGER.info("- {} rows to be read".format(total_row_count))
-        for current_page in [
-            x + 1 for x in range(0, int((total_row_count - 1) / page_size) + 1)
-        ]:
-            sheet = get_page(current_page)
-            dfs.append(
-                pd.DataFrame(
-                    [[c.value for c in r.cells] for r in sheet.rows], dtype="object"
-                )
-            )
-
-        df = pd.concat(dfs, ignore_index=True)
-        df.columns = [c.title for c in sheet.columns]
-        for t in [c.title for c in sheet.columns]:
-            try:
-                df.astype({t: "float"})
-            except Exception as _:
-                try:
-                    df.astype({t: "int64"})
-                except Exception as _:
-                    try:
-                        df = df.astype({t: "string"})
-                    except Exception as _:
-                        pass
+        n_pages = math.ceil(total_row_count / page_size)
+        # pages are written in place into one buffer per column, sized upfront,
+        # as soon as they arrive, so only pages not yet copied are kept alive
+        cols = [np.empty(total_row_count, dtype="object") for _ in col_titles]
+        # rows actually written, less than probed if the sheet shrank meanwhile
+        written = 0
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pages = executor.map(get_page, range(1, n_pages + 1))
+            for page in pages:
+                rows = page.rows[: total_row_count - written]
+                for i, col in enumerate(cols):
+                    col[written : written + len(rows)] = [
+                        r.cells[i].value for r in rows
+                    ]
+                written += len(rows)
+
+        # the buffers are typed straight into Arrow, no intermediate DataFrame
+        table = pa.table(
+            {
+                title: _to_arrow_column(col[:written])
+                for title, col in zip(col_titles, cols)
+            }
+        )
 
         if not self.sheetIsReport:
             df_sheets = pd.DataFrame([])
@@ -123,7 +131,26 @@ class SmartsheetReaderNode(knext.PythonNode):
             df_sheets = pd.DataFrame([[s.id, s.name] for s in sheet.source_sheets])
             df_sheets.columns = ["Sheet ID", "Sheet Name"]
 
-        return knext.Table.from_pandas(df), knext.Table.from_pandas(df_sheets)
+        return knext.Table.from_pyarrow(table), knext.Table.from_pandas(df_sheets)
+
+
+def _to_arrow_column(values: np.ndarray) -> pa.Array:
+    """Converts a column of raw cell values to the narrowest fitting Arrow type."""
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == "boolean":
+        return pa.array(values, type=pa.bool_(), from_pandas=True)
+    if kind in ("integer", "floating", "mixed-integer-float", "decimal"):
+        numbers = pa.array(pd.to_numeric(values, errors="coerce"), from_pandas=True)
+        if (
+            pa.types.is_floating(numbers.type)
+            and pc.all(pc.equal(pc.floor(numbers), numbers)).as_py()
+        ):
+            try:
+                return numbers.cast(pa.int64())
+            except pa.ArrowInvalid as _:
+                pass
+        return numbers
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
 
 
 def _get_access_token_from_credentials_configuration(
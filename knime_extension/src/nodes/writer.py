@@ -1,11 +1,19 @@
 import os
 import logging
+import math
 
 import knime_extension as knext
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import smartsheet
+import smartsheet.exceptions
+from requests import RequestException
+from collections import Counter
 from collections.abc import Callable
-from typing import Dict, List, NewType
+from typing import Dict, List, NewType, Set, Tuple
+
+from nodes.client import get_smartsheet_client
 
 RowId = NewType("RowId", int)
 ColumnId = NewType("ColumnId", int)
@@ -16,6 +24,13 @@ SyncRef = NewType("SyncRef", str)
 LOGGER = logging.getLogger(__name__)
 
 TOKEN_NAME = "SMARTSHEET_ACCESS_TOKEN"
+# column holding the KNIME row keys in the pyarrow view of the input table
+ROW_ID_COLUMN = "<RowID>"
+
+# rows sent per API request
+PAGE_SIZE = 300
+# failures of a request, JSON encoding errors are not wrapped by the SDK
+REQUEST_ERRORS = (smartsheet.exceptions.SmartsheetException, RequestException)
 
 
 @knext.node(
@@ -83,49 +98,108 @@ class SmartsheetWriterNode(knext.PythonNode):
         if col_type == "CHECKBOX":
             return bool(pd_value)
 
-        try:
-            if float(int(pd_value)) == float(pd_value):
+        if isinstance(pd_value, (int, np.integer)):
+            return int(pd_value)
+        elif isinstance(pd_value, (float, np.floating)):
+            if float(pd_value).is_integer():
                 return int(pd_value)
-            else:
+            elif math.isfinite(pd_value):
                 return float(pd_value)
-        except Exception as _e:
+            else:
+                # infinity is not valid JSON, it is written as text like before
+                return str(pd_value)
+        else:
             return str(pd_value)
 
+    @classmethod
+    def get_smartsheet_column_values(
+        cls, pa_values: pa.ChunkedArray, col_type: ColumnType
+    ):
+        # same conversion as get_smartsheet_cell_value, inlined for typed columns
+        pa_type = pa_values.type
+        values = pa_values.to_pylist()
+        if pa.types.is_floating(pa_type):
+            # NaN is a value for Arrow but a missing cell for Smartsheet
+            values = [None if v != v else v for v in values]
+
+        if col_type == "CHECKBOX":
+            return ["" if v is None else bool(v) for v in values]
+        elif pa.types.is_boolean(pa_type) or pa.types.is_integer(pa_type):
+            return ["" if v is None else int(v) for v in values]
+        elif pa.types.is_floating(pa_type):
+            return [
+                (
+                    cls.get_smartsheet_cell_value(v, col_type)
+                    if v is None or not math.isfinite(v)
+                    else (int(v) if v.is_integer() else v)
+                )
+                for v in values
+            ]
+        else:
+            return [cls.get_smartsheet_cell_value(v, col_type) for v in values]
+
     def execute(self, exec_context: knext.ExecutionContext, input):
         if not self.access_token:
             self.access_token = _get_access_token_from_credentials_configuration(
                 exec_context
             )
-        input_pandas: pd.PeriodDtype = input.to_pandas()
-
-        smart: smartsheet.Smartsheet = smartsheet.Smartsheet(self.access_token)
-        sheet = smart.Sheets.get_sheet(self.sheetId)
-        if not sheet:
-            raise knext.InvalidParametersError("Output sheet not found in Smartsheet")
+        input_arrow: pa.Table = input.to_pyarrow()
+        input_columns: List[ColumnTitle] = [
+            c for c in input_arrow.column_names if c != ROW_ID_COLUMN
+        ]
+        # checked before any API call, even when the input is empty
+        if self.referenceColumn not in input_columns:
+            raise knext.InvalidParametersError(
+                "Reference column not found in input columns"
+            )
+        input_references: List[SyncRef] = input_arrow.column(
+            self.referenceColumn
+        ).to_pylist()
+        duplicated_refs: Set[SyncRef] = {
+            ref
+            for ref, count in Counter(
+                r for r in input_references if r is not None
+            ).items()
+            if count > 1
+        }
+        # a cleared sheet has no matches, every ref is then added as new
+        if self.clearFirst and self.addMissingRefs and duplicated_refs:
+            _raise_duplicated_refs(duplicated_refs)
+        # an empty input still has to clear the sheet if requested
+        if input_arrow.num_rows == 0 and not self.clearFirst:
+            LOGGER.info("no input rows, nothing to be done")
+            return None
+
+        # requests are sent one at a time, a single connection is enough
+        smart: smartsheet.Smartsheet = get_smartsheet_client(self.access_token, 1)
+        try:
+            sheet = smart.Sheets.get_sheet(self.sheetId)
+        except smartsheet.exceptions.ApiError as e:
+            raise knext.InvalidParametersError(
+                "Output sheet not found in Smartsheet: {}".format(e.message)
+            )
 
         if self.clearFirst:
             LOGGER.info("deleting all existing rows...")
-            page_size = 300
             row_ids: List[RowId] = [r.id for r in sheet.rows]
-            for ids in [row_ids[i:i+page_size] for i in range(0, len(row_ids), page_size)]:
-                smart.Sheets.delete_rows(self.sheetId, ids)
-            sheet = smart.Sheets.get_sheet(self.sheetId)
+            try:
+                # Smartsheet rejects concurrent writes to one sheet (4004)
+                for ids in _chunks(row_ids, PAGE_SIZE):
+                    smart.Sheets.delete_rows(self.sheetId, ids)
+            except REQUEST_ERRORS as e:
+                raise RuntimeError(
+                    "Failed to clear the output sheet: {}".format(_error_message(e))
+                )
+            # all rows are gone, the already fetched columns are still valid
+            sheet.rows = []
 
-        input_columns: List[ColumnTitle] = [c for c in input_pandas]
         output_columns: Dict[ColumnTitle, ColumnId] = {
             c.title: c.id for c in sheet.columns
         }
-        output_columns_name_by_id: Dict[ColumnId, ColumnTitle] = {
-            v: k for k, v in output_columns.items()
-        }
 
         LOGGER.info("input: %s", repr({c: c in output_columns for c in input_columns}))
         LOGGER.info("output: %s", repr(output_columns))
 
-        if self.referenceColumn not in input_columns:
-            raise knext.InvalidParametersError(
-                "Reference column not found in input columns"
-            )
         if self.referenceColumn not in output_columns.keys():
             raise knext.InvalidParametersError(
                 "Reference column not found in output columns"
@@ -133,27 +207,44 @@ class SmartsheetWriterNode(knext.PythonNode):
 
         ref_column_id: ColumnId = output_columns[self.referenceColumn]
 
-        input_references: List[SyncRef] = [
-            r for r in input_pandas[self.referenceColumn]
-        ]
         LOGGER.info("input refs: %s", repr(input_references))
 
-        output_ref_no_match: List[SyncRef] = list()
-        output_ref_to_be_synced: Dict[SyncRef, RowId] = dict()
-        output_data_to_be_synced: Dict[RowId, smartsheet.models.Row] = dict()
-        output_ref_missing: List[SyncRef] = list()
-        for row in sheet.rows:
-            for cell in [c for c in row.cells if c.value is not None]:
-                if cell.column_id == ref_column_id:
-                    if cell.value in input_references:
-                        output_ref_to_be_synced[SyncRef(cell.value)] = row.id
-                        output_data_to_be_synced[row.id] = row
-                    else:
-                        output_ref_no_match.append(SyncRef(cell.value))
-        output_ref_missing = [
-            ref for ref in input_references if ref not in output_ref_to_be_synced.keys()
+        output_references: pd.Series = pd.Series(
+            {
+                row.id: cell.value
+                for row in sheet.rows
+                for cell in row.cells
+                if cell.column_id == ref_column_id and cell.value is not None
+            },
+            dtype="object",
+        )
+        input_index = pd.Index(input_references)
+        output_index = pd.Index(output_references.values)
+        matching_index = input_index.intersection(output_index, sort=False)
+
+        output_ref_no_match: List[SyncRef] = list(
+            output_index.difference(input_index, sort=False)
+        )
+        output_ref_to_be_synced: Dict[SyncRef, RowId] = {
+            SyncRef(ref): row_id
+            for row_id, ref in output_references.items()
+            if ref in matching_index
+        }
+        # input row positions, so that every row with an empty ref is kept
+        # (Index.difference would also turn a None ref into NaN)
+        output_ref_missing: List[int] = [
+            i
+            for i, ref in enumerate(input_references)
+            if ref not in output_ref_to_be_synced
         ]
 
+        # repeated refs are only ambiguous when they are actually written
+        used_refs: Set[SyncRef] = set(output_ref_to_be_synced)
+        if self.addMissingRefs:
+            used_refs.update(input_references[i] for i in output_ref_missing)
+        if duplicated_refs & used_refs:
+            _raise_duplicated_refs(duplicated_refs & used_refs)
+
         LOGGER.info("sync to be done:")
         LOGGER.info("- matching refs: %d -> UPDATE", len(output_ref_to_be_synced))
         LOGGER.info(
@@ -166,72 +257,133 @@ class SmartsheetWriterNode(knext.PythonNode):
             len(output_ref_no_match),
             "DELETE" if self.removeOldRefs else "SKIP",
         )
-
-        indexed_input = input_pandas.set_index(self.referenceColumn)
+        if not output_ref_to_be_synced and (
+            not self.addMissingRefs or not output_ref_missing
+        ):
+            LOGGER.info("nothing to be synced")
+            return None
 
         columns_type: Dict[ColumnId:ColumnType] = {c.id: c.type for c in sheet.columns}
 
+        # cell values are converted once per column, the loops only look them up
+        converted_columns: Dict[ColumnTitle, List] = {
+            column_name: self.get_smartsheet_column_values(
+                input_arrow.column(column_name),
+                columns_type[output_columns[column_name]],
+            )
+            for column_name in input_columns
+            if column_name in output_columns
+        }
+        ref_positions: Dict[SyncRef, int] = {
+            ref: i for i, ref in enumerate(input_references)
+        }
+
         # sync existing rows
-        updated_rows: List[smartsheet.models.Row] = []
+        updated_rows: List[Dict[str, object]] = []
         synced_columns = set(input_columns) - {self.referenceColumn}
+        synced_cols: List[Tuple[ColumnId, ColumnTitle]] = [
+            (c.id, c.title) for c in sheet.columns if c.title in synced_columns
+        ]
         for ref, rowId in output_ref_to_be_synced.items():
-            updated_row: smartsheet.models.Row = smartsheet.models.Row()
-            updated_row.id = rowId
-            source_row = indexed_input.loc[ref]
-
-            target_row: smartsheet.models.Row = output_data_to_be_synced[rowId]
-
-            for old_cell in target_row.cells:
-                if output_columns_name_by_id[old_cell.column_id] in synced_columns:
-                    updated_cell: smartsheet.models.Cell = smartsheet.models.Cell()
-                    updated_cell.column_id = old_cell.column_id
-
-                    value = source_row[output_columns_name_by_id[old_cell.column_id]]
-                    updated_cell.value = self.get_smartsheet_cell_value(
-                        value, columns_type[old_cell.column_id]
-                    )
-
-                    updated_row.cells.append(updated_cell)
+            position = ref_positions[ref]
+
+            # rows are sent as raw payloads, the SDK serializes dicts as they are
+            updated_row: Dict[str, object] = {
+                "id": rowId,
+                "cells": [
+                    {
+                        "columnId": column_id,
+                        "value": converted_columns[column_name][position],
+                    }
+                    for column_id, column_name in synced_cols
+                ],
+            }
 
             # add row to the list
             updated_rows.append(updated_row)
-        if len(updated_rows) > 0:
-            smart.Sheets.update_rows(self.sheetId, updated_rows)
-        LOGGER.info("- {} matching rows UPDATED".format(len(updated_rows)))
 
         # add new rows
+        new_rows: List[Dict[str, object]] = []
         if self.addMissingRefs:
-            new_rows: List[smartsheet.models.Row] = []
-            for ref in output_ref_missing:
-                new_row: smartsheet.models.Row = smartsheet.models.Row()
-                new_row.to_bottom = True
-                source_row = indexed_input.loc[ref]
-
-                for column_name, column_id in output_columns.items():
-                    if column_name in input_columns:
-                        new_cell: smartsheet.models.Cell = smartsheet.models.Cell()
-                        new_cell.column_id = column_id
-
-                        if column_name != self.referenceColumn:
-                            value = source_row[column_name]
-                        else:
-                            value = source_row.name
-                        new_cell.value = self.get_smartsheet_cell_value(
-                            value, columns_type[column_id]
-                        )
-
-                        new_row.cells.append(new_cell)
+            input_columns_set: Set[ColumnTitle] = set(input_columns)
+            written_columns: List[Tuple[ColumnTitle, ColumnId]] = [
+                (column_name, column_id)
+                for column_name, column_id in output_columns.items()
+                if column_name in input_columns_set
+            ]
+            for position in output_ref_missing:
+                new_row: Dict[str, object] = {
+                    "toBottom": True,
+                    "cells": [
+                        {
+                            "columnId": column_id,
+                            "value": converted_columns[column_name][position],
+                        }
+                        for column_name, column_id in written_columns
+                    ],
+                }
 
                 # add row to the list
                 new_rows.append(new_row)
 
-            if len(new_rows) > 0:
-                smart.Sheets.add_rows(self.sheetId, new_rows)
+        # Smartsheet rejects concurrent writes to one sheet (4004), the
+        # chunks are sent one after the other
+        failures: List[str] = []
+        updated_count = 0
+        for rows in _chunks(updated_rows, PAGE_SIZE):
+            try:
+                smart.Sheets.update_rows(self.sheetId, rows)
+                updated_count += len(rows)
+            except REQUEST_ERRORS as e:
+                failures.append(_error_message(e))
+        # inserts stop at the first failure to keep the input order
+        inserted_count = 0
+        unsent_count = 0
+        for rows in _chunks(new_rows, PAGE_SIZE):
+            try:
+                smart.Sheets.add_rows(self.sheetId, rows)
+                inserted_count += len(rows)
+            except REQUEST_ERRORS as e:
+                failures.append(_error_message(e))
+                unsent_count = len(new_rows) - inserted_count - len(rows)
+                break
+        if failures:
+            raise RuntimeError(
+                "The output sheet is only partially written: {}/{} rows updated, "
+                "{}/{} rows inserted, {} rows not sent. Errors: {}".format(
+                    updated_count,
+                    len(updated_rows),
+                    inserted_count,
+                    len(new_rows),
+                    unsent_count,
+                    "; ".join(failures),
+                )
+            )
+
+        LOGGER.info("- {} matching rows UPDATED".format(len(updated_rows)))
+        if self.addMissingRefs:
             LOGGER.info("- {} new rows CREATED".format(len(new_rows)))
 
         return None
 
 
+def _error_message(e: Exception) -> str:
+    # only API errors carry a message, the others describe themselves
+    return getattr(e, "message", None) or str(e)
+
+
+def _raise_duplicated_refs(refs: Set[SyncRef]):
+    raise knext.InvalidParametersError(
+        "Reference column contains duplicated values: {}".format(
+            ", ".join(sorted(repr(r) for r in refs))
+        )
+    )
+
+
+def _chunks(items: List, size: int) -> List[List]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
 def _get_access_token_from_credentials_configuration(
     context: knext.ConfigurationContext,
 ):